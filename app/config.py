@@ -1,13 +1,8 @@
 from pydantic_settings import BaseSettings
 from pydantic import field_validator
+from functools import lru_cache
 from typing import List
 import secrets
-import os
-from dotenv import load_dotenv
-
-
-# Ensure .env is loaded eagerly
-load_dotenv(dotenv_path=".env")
 
 
 class Settings(BaseSettings):
@@ -64,4 +59,10 @@ class Settings(BaseSettings):
 		env_file_encoding = "utf-8"
 
 
-settings = Settings()
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+	"""Construct Settings once per process; usable as a FastAPI dependency."""
+	return Settings()
+
+
+settings = get_settings()
@@ -1,12 +1,13 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from starlette.responses import JSONResponse
+from starlette.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse
 
 from app.config import settings
 from app.utils.logging import configure_logging
-from app.routers.questions import router as questions_router
+from app.routers.questions import router as questions_router, drain_auto_evaluations
 from app.routers.ws import router as ws_router
-from app.routers.diagrams import router as diagrams_router
+from app.routers.diagrams import router as diagrams_router, aclose_http_client
 from app.routers.evaluate import router as evaluate_router
 from app.utils.audit import auditor
 from app.services.llm_service import llm_service
@@ -14,7 +15,40 @@ from app.services.llm_service import llm_service
 
 configure_logging()
 auditor.configure(settings.analytics_path)
-app = FastAPI(title="Interview Assistant Backend", version="0.1.0")
+app = FastAPI(title="Interview Assistant Backend", version="0.1.0", default_response_class=ORJSONResponse)
+
+
+class BodySizeLimitMiddleware:
+	"""Pure-ASGI guard that rejects oversized bodies on selected paths via
+	Content-Length, before FastAPI reads or JSON-parses the body."""
+
+	def __init__(self, app, limits: dict[str, int]) -> None:
+		self.app = app
+		self.limits = limits
+
+	async def __call__(self, scope, receive, send) -> None:
+		if scope["type"] == "http":
+			max_bytes = self.limits.get(scope["path"])
+			if max_bytes is not None:
+				for name, value in scope["headers"]:
+					if name == b"content-length":
+						try:
+							length = int(value)
+						except ValueError:
+							break
+						if length > max_bytes:
+							await send({
+								"type": "http.response.start",
+								"status": 413,
+								"headers": [(b"content-type", b"application/json")],
+							})
+							await send({
+								"type": "http.response.body",
+								"body": b'{"detail":"Request body too large"}',
+							})
+							return
+						break
+		await self.app(scope, receive, send)
 
 # CORS
 app.add_middleware(
@@ -22,16 +56,40 @@ app.add_middleware(
 	allow_origins=settings.cors_allow_origins,
 	# Wildcard origins require credentials to be False per CORS spec
 	allow_credentials=False if settings.cors_allow_origins == ["*"] else True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-	expose_headers=["*"],
-    max_age=3600,
+	# Explicit lists keep CORSMiddleware on its static-header fast path;
+	# wildcards force it to enumerate/echo headers on every response
+	allow_methods=["GET", "POST", "DELETE", "OPTIONS"],
+	allow_headers=["Authorization", "Content-Type"],
+	expose_headers=["X-Cache"],
+	# Let browsers cache the preflight result as long as they allow
+	# (86400s for Firefox, capped at 7200s by Chrome)
+	max_age=86400,
 )
 
+# Compress large, highly compressible bodies (rendered SVGs especially)
+app.add_middleware(GZipMiddleware, minimum_size=1024, compresslevel=5)
+
+# Cap diagram payloads before any body read; the router enforces the
+# finer-grained 40 KB code limit after JSON parsing
+app.add_middleware(BodySizeLimitMiddleware, limits={"/api/render_mermaid": 64 * 1024})
+
+
+@app.on_event("startup")
+async def start_audit_batching() -> None:
+	await auditor.start()
+
+
+@app.on_event("shutdown")
+async def shutdown_http_clients() -> None:
+	# Let queued auto-evaluations finish before their HTTP client goes away
+	await drain_auto_evaluations()
+	await aclose_http_client()
+	await auditor.stop()
+
 
 @app.get("/health")
-async def health() -> JSONResponse:
-	return JSONResponse({
+async def health() -> ORJSONResponse:
+	return ORJSONResponse({
 		"status": "ok",
 		"version": app.version,
 		"llm": {"provider": settings.llm_provider, "enabled": llm_service.enabled}
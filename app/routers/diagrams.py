@@ -1,27 +1,255 @@
 from __future__ import annotations
 
+import asyncio
+import base64
+import hashlib
+import logging
+import re
+import time
+from collections import OrderedDict
+from io import StringIO
+
 from fastapi import APIRouter, Depends, HTTPException, Query
-from fastapi.responses import Response
+from fastapi.responses import Response, StreamingResponse
 import httpx
 
 from app.utils.security import verify_api_key
 
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter()
 
+# Shared pooled client for all outbound render calls. Building a client per
+# request pays a fresh TCP+TLS handshake to the render services; a module-level
+# pool keeps connections alive across requests.
+_HTTP_CLIENT = httpx.AsyncClient(
+    timeout=httpx.Timeout(15.0, connect=3.0),
+    transport=httpx.AsyncHTTPTransport(
+        retries=1,
+        limits=httpx.Limits(max_keepalive_connections=64, max_connections=128),
+    ),
+)
+
+
+async def aclose_http_client() -> None:
+    """Close the shared render client pool (called on app shutdown)."""
+    await _HTTP_CLIENT.aclose()
+
+
+# Rendered SVGs are a pure function of the post-transform code + theme, so
+# identical diagrams can skip the render-service round-trip entirely.
+# Bounded LRU sized in bytes (values are large), evicting oldest-used first.
+_SVG_CACHE: "OrderedDict[bytes, bytes]" = OrderedDict()
+_SVG_CACHE_MAX_BYTES = 64 * 1024 * 1024
+_svg_cache_size = 0
+
+# Rendered SVGs are content-addressed, so clients/CDNs can cache them hard
+_SVG_CACHE_CONTROL = "public, max-age=86400, immutable"
+
+# Circuit breaker: when both render services keep failing, reject fast for a
+# cooldown window instead of pinning a worker for the full upstream timeout
+_CB_FAILURE_THRESHOLD = 5
+_CB_WINDOW_SECONDS = 30.0
+_CB_COOLDOWN_SECONDS = 30.0
+_cb_failures = 0
+_cb_window_start = 0.0
+_cb_open_until = 0.0
+
+
+async def _open_svg_stream(request: httpx.Request):
+    """Send `request` in streaming mode and sniff the response head.
+
+    Returns (response, head_bytes, body_iterator) when the upstream answered
+    200 with something that looks like an SVG, otherwise closes the response
+    and returns None so the caller can try the next service.
+    """
+    try:
+        resp = await _HTTP_CLIENT.send(request, stream=True)
+    except Exception as exc:
+        logger.debug("%s %s failed: %s", request.method, request.url.host, exc)
+        return None
+    logger.debug("%s response: %s", request.url.host, resp.status_code)
+    if resp.status_code != 200:
+        await resp.aclose()
+        return None
+    body_iter = resp.aiter_bytes()
+    head = b""
+    try:
+        async for chunk in body_iter:
+            head += chunk
+            if len(head.lstrip()) >= 4:
+                break
+    except Exception as exc:
+        logger.debug("%s stream failed: %s", request.url.host, exc)
+        await resp.aclose()
+        return None
+    if not head.lstrip().startswith(b"<svg"):
+        await resp.aclose()
+        return None
+    return resp, head, body_iter
+
+
+async def _race_svg_streams(requests: list[httpx.Request]):
+    """Open all render requests concurrently and keep the first usable stream.
+
+    Sequential fallback makes a degraded primary cost its full timeout before
+    the secondary is even tried; racing bounds latency to the faster service.
+    Losing streams and still-pending requests are closed/cancelled.
+    """
+    tasks = [asyncio.create_task(_open_svg_stream(request)) for request in requests]
+    winner = None
+    pending = set(tasks)
+    while pending and winner is None:
+        done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            streamed = task.result()
+            if streamed is None:
+                continue
+            if winner is None:
+                winner = streamed
+            else:
+                await streamed[0].aclose()
+    for task in pending:
+        task.cancel()
+    if pending:
+        for streamed in await asyncio.gather(*pending, return_exceptions=True):
+            if isinstance(streamed, tuple):
+                await streamed[0].aclose()
+    return winner
+
+
+def _circuit_is_open() -> bool:
+    return time.monotonic() < _cb_open_until
+
+
+def _record_render_failure() -> None:
+    global _cb_failures, _cb_window_start, _cb_open_until
+    now = time.monotonic()
+    if now - _cb_window_start > _CB_WINDOW_SECONDS:
+        _cb_window_start = now
+        _cb_failures = 0
+    _cb_failures += 1
+    if _cb_failures >= _CB_FAILURE_THRESHOLD:
+        _cb_open_until = now + _CB_COOLDOWN_SECONDS
+        _cb_failures = 0
+        logger.warning("Render circuit opened for %.0fs after repeated upstream failures", _CB_COOLDOWN_SECONDS)
+
+
+def _record_render_success() -> None:
+    global _cb_failures
+    _cb_failures = 0
+
+
+def _svg_cache_key(code_bytes: bytes, theme: str) -> bytes:
+    return hashlib.blake2b(code_bytes, digest_size=16, key=theme.encode("utf-8")[:64]).digest()
+
+
+def _svg_cache_get(key: bytes) -> bytes | None:
+    svg = _SVG_CACHE.get(key)
+    if svg is not None:
+        _SVG_CACHE.move_to_end(key)
+    return svg
+
+
+def _svg_cache_put(key: bytes, svg: bytes) -> None:
+    global _svg_cache_size
+    if key in _SVG_CACHE:
+        return
+    _SVG_CACHE[key] = svg
+    _svg_cache_size += len(svg)
+    while _svg_cache_size > _SVG_CACHE_MAX_BYTES and _SVG_CACHE:
+        _, evicted = _SVG_CACHE.popitem(last=False)
+        _svg_cache_size -= len(evicted)
+
+
+# Transform patterns, compiled once at import instead of per call
+_HEADER_RE = re.compile(r"^[ \t]*([A-Za-z0-9_]+)[ \t]*([\[\(\{])[ \t]*(.+?)[ \t]*([\]\)\}])[ \t\r]*$", re.MULTILINE)
+_EDGE_REF_RE = re.compile(r"(^|\W)([A-Za-z0-9_]+)\s*[-=~]+[ox]?\>|\<[-=~]+[ox]?\s*([A-Za-z0-9_]+)(\W|$)")
+_EDGE_PATTERN_RE = re.compile(r'^\s*([A-Za-z0-9_]+)\s*([-=~]+[ox]?[>].*?[>]\s*[A-Za-z0-9_]+)')
+_EDGE_LABEL_RE = re.compile(r"\s--\s*(\d+)\.(\s|\|)|\|\s*(\d+)\.(\s|\|)")
+_MULTI_BLANK_RE = re.compile(r"\n{3,}")
+
+# "modern" style preset: the init directive depends only on (size,
+# responsive), and the trailer is fully static, so build every variant
+# once at import instead of formatting ~600 bytes per request
+def _build_modern_init(size: str, responsive: bool) -> str:
+    if size == "compact":
+        font_size = "10px"; padding_val = 8; wrap_w = 240; node_sp = 32; rank_sp = 40; diag_pad = 8
+    elif size == "large":
+        font_size = "14px"; padding_val = 18; wrap_w = 400; node_sp = 60; rank_sp = 72; diag_pad = 20
+    else:  # medium (default)
+        font_size = "12px"; padding_val = 12; wrap_w = 300; node_sp = 45; rank_sp = 55; diag_pad = 12
+
+    return (
+        "%%{init: {\n"
+        "  'theme': 'neutral',\n"
+        "  'themeVariables': {\n"
+        f"    'fontSize':'{font_size}', 'fontFamily':'Inter, sans-serif',\n"
+        "    'lineColor':'#666', 'primaryColor':'#f8f9fa',\n"
+        f"    'edgeLabelBackground':'#ffffff', 'padding':{padding_val}, 'curve':'basis',\n"
+        f"    'textWrapWidth': {wrap_w}\n"
+        "  },\n"
+        "  'flowchart': { 'htmlLabels': true, 'useMaxWidth': " + ("true" if responsive else "false") + ",\n"
+        f"                 'nodeSpacing': {node_sp}, 'rankSpacing': {rank_sp},\n"
+        f"                 'diagramPadding': {diag_pad}, 'wrap': true " + "}\n"
+        "}}%%\n"
+    )
+
+
+_MODERN_INIT = {
+    (size, responsive): _build_modern_init(size, responsive)
+    for size in ("compact", "medium", "large")
+    for responsive in (True, False)
+}
+
+_MODERN_TRAILER = (
+    "\nlinkStyle default stroke:#666,stroke-width:1.3px;\n"
+    "classDef client fill:#e3f2fd,stroke:#1976d2,color:#000;\n"
+    "classDef network fill:#fff3e0,stroke:#e65100,color:#000;\n"
+    "classDef service fill:#fff8e1,stroke:#f57f17,color:#000;\n"
+    "classDef storage fill:#f1f8e9,stroke:#2e7d32,color:#000;\n"
+    "classDef queue fill:#e0f7fa,stroke:#006064,color:#000;\n"
+    "classDef cache fill:#f3e5f5,stroke:#6a1b9a,color:#000;\n"
+)
+
+# Typographic characters that LLM-generated diagrams often carry and that
+# Mermaid parses badly: smart quotes/dashes become ASCII, NBSP becomes a
+# plain space, and zero-width characters/BOM are dropped. One table lets
+# str.translate fix all of them in a single C-level pass.
+_NORMALIZE_TABLE = str.maketrans({
+    0x2018: "'", 0x2019: "'",   # curly single quotes
+    0x201C: '"', 0x201D: '"',   # curly double quotes
+    0x2013: "-", 0x2014: "-",   # en/em dashes
+    0x00A0: " ",                # non-breaking space
+    0x200B: None, 0x200C: None, 0x200D: None, 0xFEFF: None,
+})
+
+# Circled numerals for edge-label prettification (string keys so the
+# substitution callback can index by the raw match without an int() cast)
+_CIRCLED_DIGITS = {
+    "1": "①", "2": "②", "3": "③", "4": "④", "5": "⑤",
+    "6": "⑥", "7": "⑦", "8": "⑧", "9": "⑨", "10": "⑩",
+    "11": "⑪", "12": "⑫", "13": "⑬", "14": "⑭", "15": "⑮",
+    "16": "⑯", "17": "⑰", "18": "⑱", "19": "⑲", "20": "⑳",
+}
+
 
 def _sanitize_code(raw: str) -> str:
-    """Remove surrounding markdown fences if present."""
-    text = raw.strip()
+    """Normalize typographic characters and remove surrounding markdown
+    fences if present."""
+    text = raw.translate(_NORMALIZE_TABLE).strip()
     if text.startswith("```"):
-        # Remove first line of fence
-        lines = text.split("\n")
-        if lines:
-            # drop first line and any closing fence line
-            body = "\n".join(lines[1:])
-            if body.rstrip().endswith("```"):
-                body = body[: body.rfind("```")].rstrip()
-            return body
+        # Drop the fence line and any closing fence by slicing; no need to
+        # materialize a list of every line
+        nl = text.find("\n")
+        if nl == -1:
+            return ""
+        body = text[nl + 1:]
+        stripped = body.rstrip()
+        if stripped.endswith("```"):
+            return stripped[: stripped.rfind("```")].rstrip()
+        return body
     return text
 
 
@@ -43,28 +271,23 @@ def _convert_layer_nodes_to_subgraphs(code: str) -> str:
     src = code
     if "subgraph" in src:
         return src
+    # Header lines need a bracketed label; a C-level membership check skips
+    # the regex scans entirely for diagrams without any
+    if "[" not in src and "(" not in src and "{" not in src:
+        return src
 
-    import re as _re
-
-    lines = src.split("\n")
-    header_regex = _re.compile(r"^\s*([A-Za-z0-9_]+)\s*([\[\(\{])\s*(.+?)\s*([\]\)\}])\s*$")
-
-    # Gather edge references to avoid converting nodes that are used in edges
-    edge_ref_regex = _re.compile(r"(^|\W)([A-Za-z0-9_]+)\s*[-=~]+[ox]?\>|\<[-=~]+[ox]?\s*([A-Za-z0-9_]+)(\W|$)")
+    # Gather edge references in one scan over the full source to avoid
+    # converting nodes that are used in edges
     edge_refs: set[str] = set()
-    for line in lines:
-        for m in edge_ref_regex.finditer(line):
-            # Matches either source in group 2 or target in group 3
-            if m.group(2):
-                edge_refs.add(m.group(2))
-            if m.group(3):
-                edge_refs.add(m.group(3))
-
-    header_indices: list[tuple[int, str, str]] = []  # (line_index, id, label)
-    for idx, line in enumerate(lines):
-        m = header_regex.match(line)
-        if not m:
-            continue
+    for m in _EDGE_REF_RE.finditer(src):
+        # Matches either source in group 2 or target in group 3
+        if m.group(2):
+            edge_refs.add(m.group(2))
+        if m.group(3):
+            edge_refs.add(m.group(3))
+
+    headers: list[tuple[int, int, str, str]] = []  # (start, end, id, label)
+    for m in _HEADER_RE.finditer(src):
         node_id, _open, label, _close = m.groups()
         label_clean = label.strip()
         lower = label_clean.lower()
@@ -76,129 +299,118 @@ def _convert_layer_nodes_to_subgraphs(code: str) -> str:
         )
         # Only convert if it looks like a grouping header and is not referenced in edges
         if looks_like_layer and node_id not in edge_refs:
-            header_indices.append((idx, node_id, label.strip()))
+            headers.append((m.start(), m.end(), node_id, label_clean))
 
-    if not header_indices:
+    if not headers:
         return src
 
-    # Build new code with subgraphs spanning header-to-next-header-1
-    result: list[str] = []
-    i = 0
-    header_ptr = 0
-    current_block_end = -1
-    while i < len(lines):
-        if header_ptr < len(header_indices) and i == header_indices[header_ptr][0]:
-            # Open new subgraph
-            _idx, node_id, label = header_indices[header_ptr]
-            # Determine end
-            if header_ptr + 1 < len(header_indices):
-                current_block_end = header_indices[header_ptr + 1][0]
-            else:
-                current_block_end = len(lines)
-
-            # Emit subgraph header (escaped quotes inside label)
-            safe_label = label.replace('"', '\\"')
-            result.append(f"subgraph {node_id}[\"{safe_label}\"]")
-            # Skip the header node line itself
-            i += 1
-            # Emit content until next header (exclusive)
-            while i < current_block_end:
-                result.append(lines[i])
-                i += 1
-            # Close block
-            result.append("end")
-            header_ptr += 1
-            continue
-
-        # Lines before the first header or between already processed blocks
-        result.append(lines[i])
-        i += 1
-
-    # Cleanup: remove accidental double blank lines
-    out = "\n".join(result)
-    out = _re.sub(r"\n{3,}", "\n\n", out).strip()
-    return out
+    # Single pass: copy untouched regions by slice, replace each header line
+    # with a subgraph opener, and close right before the next header (or EOF)
+    buf = StringIO()
+    buf.write(src[: headers[0][0]])
+    for i, (_start, end, node_id, label) in enumerate(headers):
+        safe_label = label.replace('"', '\\"')
+        buf.write(f"subgraph {node_id}[\"{safe_label}\"]")
+        next_start = headers[i + 1][0] if i + 1 < len(headers) else len(src)
+        content = src[end:next_start]
+        buf.write(content)
+        if i + 1 < len(headers):
+            buf.write("end\n")
+        elif content.endswith("\n"):
+            buf.write("end")
+        else:
+            buf.write("\nend")
+
+    # Cleanup: remove accidental double blank lines; the membership test is a
+    # C-level memmem and skips the regex walk for already-clean output
+    out = buf.getvalue()
+    if "\n\n\n" in out:
+        out = _MULTI_BLANK_RE.sub("\n\n", out)
+    return out.strip()
+
+
+def _edge_label_repl(m: re.Match[str]) -> str:
+    num = m.group(1) or m.group(3)
+    symbol = _CIRCLED_DIGITS.get(num, num)
+    # Group 1 matched the `-- 1.` form, group 3 the `|1.` form
+    return f" -- {symbol} " if m.group(1) else f"| {symbol} "
 
 
 def _prettify_edge_labels(code: str) -> str:
     """Convert numeric step labels like `-- 1. Foo -->` into circled numerals
     to improve aesthetics. Conservative: only changes numbers 1-20.
-    """
-    import re as _re
-    circled = {
-        1: "①", 2: "②", 3: "③", 4: "④", 5: "⑤",
-        6: "⑥", 7: "⑦", 8: "⑧", 9: "⑨", 10: "⑩",
-        11: "⑪", 12: "⑫", 13: "⑬", 14: "⑭", 15: "⑮",
-        16: "⑯", 17: "⑰", 18: "⑱", 19: "⑲", 20: "⑳",
-    }
 
-    def repl(m: _re.Match[str]) -> str:
-        n = int(m.group(1))
-        symbol = circled.get(n, m.group(1))
-        return f" -- {symbol} "
-
-    # Edge label patterns:  A -- 1. Text --> B  or A ---|1. Text| B
-    code = _re.sub(r"\s--\s*(\d+)\.(\s|\|)", lambda m: repl(m), code)
-    code = _re.sub(r"\|\s*(\d+)\.(\s|\|)", lambda m: f"| {circled.get(int(m.group(1)), m.group(1))} ", code)
-    return code
+    Both edge label patterns (`A -- 1. Text --> B` and `A ---|1. Text| B`)
+    are handled in one alternation so the source is scanned once.
+    """
+    # Every match needs a "<digits>." label; no dot means nothing to do
+    if "." not in code:
+        return code
+    return _EDGE_LABEL_RE.sub(_edge_label_repl, code)
 
 
 def _add_sequential_step_numbers(code: str) -> str:
     """Add sequential step numbers to edges/arrows to show workflow sequence.
     Numbers appear on the connections between nodes: 1st arrow gets "1", 2nd gets "2", etc.
     """
-    import re as _re
-    
+    # Arrows all carry a '>' head; skip the per-line matching when absent
+    if '>' not in code:
+        return code
+
     lines = code.split('\n')
-    # More flexible edge pattern to catch various arrow styles
-    edge_pattern = _re.compile(r'^\s*([A-Za-z0-9_]+)\s*([-=~]+[ox]?[>].*?[>]\s*[A-Za-z0-9_]+)')
-    
+
     # Find all edges and track their order
     edges = []
     for i, line in enumerate(lines):
-        edge_match = edge_pattern.match(line)
+        edge_match = _EDGE_PATTERN_RE.match(line)
         if edge_match:
             from_node, edge_part = edge_match.groups()
-            edges.append((i, line, from_node, edge_part))
-    
+            edges.append((i, from_node, edge_part))
+
     if not edges:
         return code
-    
-    # Add step numbers to each edge
-    result_lines = lines.copy()
+
+    # Add step numbers to each edge, rewriting lines in place via the spans
+    # captured above instead of re-scanning each line
     step_num = 1
-    
-    for line_idx, original_line, from_node, edge_part in edges:
-        # Check if edge already has a label
-        if '|' in edge_part:
+
+    for line_idx, from_node, edge_part in edges:
+        pipe = edge_part.find('|')
+        if pipe != -1:
             # Edge has existing label, add step number before it
-            new_edge = edge_part.replace('|', f'|{step_num}. ', 1)
+            new_edge = f"{edge_part[:pipe + 1]}{step_num}. {edge_part[pipe + 1:]}"
         else:
-            # No existing label, add step number
-            new_edge = edge_part.replace('>', f'|{step_num}|', 1)
-        
+            # No existing label, add step number in place of the first arrow head
+            gt = edge_part.find('>')
+            new_edge = f"{edge_part[:gt]}|{step_num}|{edge_part[gt + 1:]}"
+
         # Replace the line
-        result_lines[line_idx] = f"  {from_node} {new_edge}"
+        lines[line_idx] = f"  {from_node} {new_edge}"
         step_num += 1
-    
-    return '\n'.join(result_lines)
 
+    return '\n'.join(lines)
 
-@router.post("/render_mermaid")
-async def render_mermaid(payload: dict):
-    """Render Mermaid code to SVG via Kroki backend.
 
-    Expected payload: { "code": "flowchart LR...", "theme": "default|dark|forest|neutral" }
-    Returns raw SVG content.
+@router.options("/render_mermaid")
+async def render_mermaid_options() -> Response:
+    """Answer preflights immediately without walking auth dependencies."""
+    return Response(status_code=200)
+
+
+async def _do_render(raw: str, theme: str, style: str, size: str = "medium", responsive: bool = True) -> Response:
+    """Shared render path for the GET and POST endpoints.
+
+    Sanitizes/transforms the Mermaid code and proxies it to the render
+    services, returning the SVG response directly.
     """
-    code = _sanitize_code(payload.get("code") or "")
+    # Basic guardrail: hard-limit size before any transform touches the string
+    if len(raw) > 40_000:
+        raise HTTPException(status_code=413, detail="Diagram too large")
+
+    code = _sanitize_code(raw)
     if not code:
         raise HTTPException(status_code=400, detail="Missing 'code' in payload")
 
-    # Basic guardrail: hard-limit size to avoid abuse
-    if len(code) > 40_000:
-        raise HTTPException(status_code=413, detail="Diagram too large")
-
     # Attempt to group layer headers into subgraphs before rendering
     try:
         code = _convert_layer_nodes_to_subgraphs(code)
@@ -206,47 +418,18 @@ async def render_mermaid(payload: dict):
         # Do not fail rendering if transformation has issues
         pass
 
-    theme = (payload.get("theme") or "").strip() or "default"
+    theme = theme.strip() or "default"
+
+    # Single scan for an existing init directive; both the style preset and
+    # the theme injection below need the same check
+    has_init = code.lstrip().startswith("%%{init")
 
     # Optional: style preset for modern elegant look without changing semantics
-    style = (payload.get("style") or "").strip().lower()
-    if style == "modern" and not code.lstrip().startswith("%%{init"):
-        size = (payload.get("size") or "medium").strip().lower()
-        responsive = (payload.get("responsive") or "true").strip().lower() == "true"
-        
-        if size == "compact":
-            font_size = "10px"; padding_val = 8; wrap_w = 240; node_sp = 32; rank_sp = 40; diag_pad = 8
-        elif size == "large":
-            font_size = "14px"; padding_val = 18; wrap_w = 400; node_sp = 60; rank_sp = 72; diag_pad = 20
-        else:  # medium (default)
-            font_size = "12px"; padding_val = 12; wrap_w = 300; node_sp = 45; rank_sp = 55; diag_pad = 12
-
-        init = (
-            "%%{init: {\n"
-            "  'theme': 'neutral',\n"
-            "  'themeVariables': {\n"
-            f"    'fontSize':'{font_size}', 'fontFamily':'Inter, sans-serif',\n"
-            "    'lineColor':'#666', 'primaryColor':'#f8f9fa',\n"
-            f"    'edgeLabelBackground':'#ffffff', 'padding':{padding_val}, 'curve':'basis',\n"
-            f"    'textWrapWidth': {wrap_w}\n"
-            "  },\n"
-            "  'flowchart': { 'htmlLabels': true, 'useMaxWidth': " + ("true" if responsive else "false") + ",\n"
-            f"                 'nodeSpacing': {node_sp}, 'rankSpacing': {rank_sp},\n"
-            f"                 'diagramPadding': {diag_pad}, 'wrap': true " + "}\n"
-            "}}%%\n"
-        )
+    if style == "modern" and not has_init:
+        init = _MODERN_INIT.get((size, responsive)) or _MODERN_INIT[("medium", responsive)]
         # Add compact spacing helpers
-        code = (
-            init
-            + code
-            + "\nlinkStyle default stroke:#666,stroke-width:1.3px;\n"
-            + "classDef client fill:#e3f2fd,stroke:#1976d2,color:#000;\n"
-            + "classDef network fill:#fff3e0,stroke:#e65100,color:#000;\n"
-            + "classDef service fill:#fff8e1,stroke:#f57f17,color:#000;\n"
-            + "classDef storage fill:#f1f8e9,stroke:#2e7d32,color:#000;\n"
-            + "classDef queue fill:#e0f7fa,stroke:#006064,color:#000;\n"
-            + "classDef cache fill:#f3e5f5,stroke:#6a1b9a,color:#000;\n"
-        )
+        code = "".join((init, code, _MODERN_TRAILER))
+        has_init = True
 
     # Optional: prettify numeric edge labels and add step numbers
     if style == "modern":
@@ -256,70 +439,89 @@ async def render_mermaid(payload: dict):
         except Exception:
             pass
 
-    # Try multiple Mermaid rendering services for better reliability
-    services = [
-        "https://mermaid.ink/svg",
-        "https://kroki.io/mermaid/svg"
-    ]
-    
     headers = {
         "Content-Type": "text/plain; charset=utf-8",
     }
 
     # Some themes are supported by Mermaid directly; inject theme directive if provided
-    if theme and theme != "default" and not code.lstrip().startswith("%%{init"):
+    if theme and theme != "default" and not has_init:
         # Prepend Mermaid init directive using valid JSON (double quotes)
         code = f"%%{{init: {{ \"theme\": \"{theme}\" }} }}%%\n" + code
 
-    import requests
-    import base64
-    
-    # Try mermaid.ink first (more reliable)
-    try:
-        print(f"DEBUG: Trying mermaid.ink")
-        print(f"DEBUG: Code: {code[:100]}...")
-        
-        # mermaid.ink uses base64 encoded diagram in URL
-        encoded_code = base64.b64encode(code.encode('utf-8')).decode('ascii')
-        url = f"https://mermaid.ink/svg/{encoded_code}"
-        
-        resp = requests.get(url, timeout=10)
-        print(f"DEBUG: mermaid.ink response: {resp.status_code}")
-        
-        if resp.status_code == 200 and resp.text.strip().startswith("<svg"):
-            svg = resp.text
-        else:
-            raise Exception(f"mermaid.ink failed: {resp.status_code}")
-            
-    except Exception as exc:
-        print(f"DEBUG: mermaid.ink failed: {exc}")
-        # Fallback to Kroki with shorter timeout
+    # Encode once, after all transforms; every consumer below wants bytes
+    code_bytes = code.encode("utf-8")
+
+    # Serve from cache when the exact post-transform diagram was rendered before
+    cache_key = _svg_cache_key(code_bytes, theme)
+    cached_svg = _svg_cache_get(cache_key)
+    if cached_svg is not None:
+        return Response(
+            content=cached_svg,
+            media_type="image/svg+xml",
+            headers={"X-Cache": "HIT", "Cache-Control": _SVG_CACHE_CONTROL},
+        )
+
+    # Fail fast while the breaker is open rather than waiting out timeouts
+    if _circuit_is_open():
+        raise HTTPException(status_code=503, detail="Diagram renderer temporarily unavailable")
+
+    # Race both render services and stream from whichever answers first with
+    # a valid SVG; mermaid.ink takes the base64-encoded diagram in the URL
+    logger.debug("Racing render services; code: %.100s...", code)
+    encoded_code = base64.b64encode(code_bytes).decode('ascii')
+    streamed = await _race_svg_streams([
+        _HTTP_CLIENT.build_request("GET", f"https://mermaid.ink/svg/{encoded_code}", timeout=10),
+        _HTTP_CLIENT.build_request("POST", "https://kroki.io/mermaid/svg", content=code_bytes, headers=headers, timeout=10),
+    ])
+    if streamed is None:
+        logger.debug("Both services failed")
+        _record_render_failure()
+        raise HTTPException(status_code=502, detail="All rendering services failed")
+
+    resp, head, body_iter = streamed
+
+    async def svg_stream():
+        # Relay upstream chunks as they arrive, accumulating a copy so the
+        # completed SVG can be cached for subsequent identical requests
+        parts = [head]
         try:
-            print(f"DEBUG: Trying Kroki as fallback")
-            url = "https://kroki.io/mermaid/svg"
-            resp = requests.post(url, data=code.encode("utf-8"), headers=headers, timeout=5)
-            print(f"DEBUG: Kroki response: {resp.status_code}")
-            
-            if resp.status_code != 200:
-                error_text = resp.text[:200] if resp.text else "No error details"
-                raise Exception(f"Kroki failed: {resp.status_code} - {error_text}")
-                
-            svg = resp.text
-            if not svg.strip().startswith("<svg"):
-                raise Exception("Invalid SVG from Kroki")
-                
-        except Exception as kroki_exc:
-            print(f"DEBUG: Both services failed. Kroki error: {kroki_exc}")
-            raise HTTPException(status_code=502, detail=f"All rendering services failed. Last error: {str(kroki_exc)}")
-
-    # Final sanity check
-    if not svg.strip().startswith("<svg"):
-        raise HTTPException(status_code=502, detail="Invalid SVG returned from renderer")
-
-    return Response(content=svg, media_type="image/svg+xml")
-
-
-@router.get("/render_mermaid")
+            yield head
+            async for chunk in body_iter:
+                parts.append(chunk)
+                yield chunk
+        finally:
+            await resp.aclose()
+        _record_render_success()
+        _svg_cache_put(cache_key, b"".join(parts))
+
+    response_headers = {"Cache-Control": _SVG_CACHE_CONTROL}
+    # Forward the upstream length only for identity responses: aiter_bytes()
+    # yields decoded bytes, so on compressed upstreams the declared
+    # (compressed) length would not match the body we stream
+    if "content-encoding" not in resp.headers:
+        upstream_length = resp.headers.get("content-length")
+        if upstream_length:
+            response_headers["Content-Length"] = upstream_length
+    return StreamingResponse(svg_stream(), media_type="image/svg+xml", headers=response_headers)
+
+
+@router.post("/render_mermaid", response_class=Response)
+async def render_mermaid(payload: dict):
+    """Render Mermaid code to SVG via Kroki backend.
+
+    Expected payload: { "code": "flowchart LR...", "theme": "default|dark|forest|neutral" }
+    Returns raw SVG content.
+    """
+    return await _do_render(
+        payload.get("code") or "",
+        payload.get("theme") or "",
+        (payload.get("style") or "").strip().lower(),
+        size=(payload.get("size") or "medium").strip().lower(),
+        responsive=(payload.get("responsive") or "true").strip().lower() == "true",
+    )
+
+
+@router.get("/render_mermaid", response_class=Response)
 async def render_mermaid_get(
     code: str = Query(default=""),
     theme: str = Query(default="default"),
@@ -328,7 +530,6 @@ async def render_mermaid_get(
 
     Accepts `code` and optional `theme` as query params and returns SVG.
     """
-    payload = {"code": code, "theme": theme}
-    return await render_mermaid(payload)
+    return await _do_render(code, theme, "")
 
 
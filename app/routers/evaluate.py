@@ -1,10 +1,16 @@
 from __future__ import annotations
 
 from fastapi import APIRouter, HTTPException, Request, Response
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse
 from datetime import datetime
-import json
+from collections import OrderedDict
+import asyncio
 import hashlib
+import logging
+import re
+import time
+
+import orjson
 from typing import Dict, Optional
 
 from app.schemas import EvaluationIn, EvaluationOut, EvaluationScores, StaticSignals
@@ -13,34 +19,108 @@ from app.services.code_evaluation_service import evaluate_code
 from app.utils.audit import auditor
 
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter()
 
-# In-memory cache for evaluations
-_evaluation_cache: Dict[str, EvaluationOut] = {}
+# Strong references to in-flight audit tasks so the event loop cannot
+# garbage-collect them mid-write
+_audit_tasks: set[asyncio.Task] = set()
+
+
+def _audit_in_background(entry: dict) -> None:
+	"""Fire-and-forget audit write so the response is not held back by it."""
+	task = asyncio.create_task(auditor.log(entry))
+	_audit_tasks.add(task)
+
+	def _done(t: asyncio.Task) -> None:
+		_audit_tasks.discard(t)
+		if not t.cancelled() and t.exception():
+			logger.warning("audit log failed: %s", t.exception())
+
+	task.add_done_callback(_done)
+
+
+# Futures for evaluations currently in progress, keyed like the cache, so
+# duplicate concurrent requests coalesce onto one LLM call
+_inflight: Dict[str, asyncio.Future] = {}
+
+# In-memory cache for evaluations: LRU bounded by entry count, with a TTL so
+# stale critiques age out instead of growing memory linearly with traffic.
+# Values carry the response pre-serialized to JSON bytes so hits skip pydantic
+# serialization entirely. The cache key includes the session id, so the stored
+# bytes are valid as-is for every hit. Handlers never await between cache
+# operations, so no lock is needed.
+_EVAL_CACHE_MAX_ENTRIES = 2048
+_EVAL_CACHE_TTL_SECONDS = 3600.0
+_evaluation_cache: "OrderedDict[str, tuple[float, EvaluationOut, bytes]]" = OrderedDict()
+
+
+def _eval_cache_get(key: str) -> Optional[tuple[EvaluationOut, bytes]]:
+	entry = _evaluation_cache.get(key)
+	if entry is None:
+		return None
+	expires_at, resp, body = entry
+	if time.monotonic() > expires_at:
+		del _evaluation_cache[key]
+		return None
+	_evaluation_cache.move_to_end(key)
+	return resp, body
+
+
+def _eval_cache_put(key: str, resp: EvaluationOut) -> None:
+	body = orjson.dumps(resp.model_dump(mode="json"))
+	_evaluation_cache[key] = (time.monotonic() + _EVAL_CACHE_TTL_SECONDS, resp, body)
+	_evaluation_cache.move_to_end(key)
+	while len(_evaluation_cache) > _EVAL_CACHE_MAX_ENTRIES:
+		_evaluation_cache.popitem(last=False)
+
+# Splits the critique into its headed sections in one scan instead of
+# re-searching the full text once per heading
+_SECTION_RE = re.compile(
+	r"^(Approach|Summary|Strengths|Weaknesses|Scores|Recommendations):[ \t]*"
+	r"(.*?)(?=^(?:Approach|Summary|Strengths|Weaknesses|Scores|Recommendations):|\Z)",
+	re.MULTILINE | re.DOTALL,
+)
+
+# First JSON object (one nesting level deep) in the Scores section; robust
+# against prose around the blob, unlike paired find("{")/find("}")
+_SCORES_BLOB_RE = re.compile(r"\{(?:[^{}]|\{[^{}]*\})*\}", re.DOTALL)
+
+# Extracts "- item" bullet lines in one C-level scan
+_BULLET_RE = re.compile(r"^[ \t]*-[ \t]+(.*?)[ \t]*$", re.MULTILINE)
+
+
+def _bullets(text: str) -> list[str]:
+	return _BULLET_RE.findall(text)
+
+
+# Static preflight headers built once; only the origin/requested-headers
+# echoes vary per request
+_STATIC_CORS = {
+	"Vary": "Origin",
+	"Access-Control-Allow-Methods": "POST, OPTIONS",
+	"Access-Control-Max-Age": "3600",
+}
 
 
 @router.options("/evaluate")
 async def evaluate_cors_options(request: Request) -> Response:
-	origin = request.headers.get("origin", "*")
-	acr_headers = request.headers.get("access-control-request-headers", "*")
-	headers = {
-		"Access-Control-Allow-Origin": origin,
-		"Vary": "Origin",
-		"Access-Control-Allow-Headers": acr_headers,
-		"Access-Control-Allow-Methods": "POST, OPTIONS",
-		"Access-Control-Max-Age": "3600",
-	}
+	headers = _STATIC_CORS.copy()
+	headers["Access-Control-Allow-Origin"] = request.headers.get("origin", "*")
+	headers["Access-Control-Allow-Headers"] = request.headers.get("access-control-request-headers", "*")
 	return Response(status_code=204, headers=headers)
 
 
-@router.post("/evaluate", response_model=EvaluationOut)
+@router.post("/evaluate", response_model=EvaluationOut, response_class=ORJSONResponse)
 async def evaluate(payload: EvaluationIn, request: Request, response: Response):
 	try:
 		await session_manager.get_required(payload.session_id)
 	except KeyError:
 		raise HTTPException(status_code=404, detail="Session not found. Create one via POST /api/session and reuse its session_id.")
 
-	if not payload.code.strip():
+	code_stripped = payload.code.strip()
+	if not code_stripped:
 		raise HTTPException(status_code=400, detail="Empty code")
 
 	# Get session context for cache key
@@ -48,42 +128,89 @@ async def evaluate(payload: EvaluationIn, request: Request, response: Response):
 	
 	# Create cache key based on session + conversation context + code
 	# This ensures same code in different conversations gets different evaluations
-	conversation_context = ""
-	if session_state.qna:
-		# Use last 2 QnA pairs for context
-		recent_qna = session_state.qna[-2:] if len(session_state.qna) >= 2 else session_state.qna
-		for item in recent_qna:
-			conversation_context += f"Q: {item.get('question', '')}\nA: {item.get('answer', '')}\n"
-	
-	cache_key = hashlib.md5(
-		f"{payload.session_id}|{conversation_context}|{payload.code.strip()}|{payload.problem or ''}|{payload.language or 'python'}".encode()
-	).hexdigest()
+	conversation_context = session_state.recent_context()
+
+	# BLAKE2b is markedly faster than MD5 for keying, and feeding the hasher
+	# component-wise avoids materializing one giant intermediate string
+	h = hashlib.blake2b(digest_size=16)
+	for part in (payload.session_id, conversation_context, code_stripped, payload.problem or "", payload.language or "python"):
+		h.update(part.encode())
+		h.update(b"|")
+	cache_key = h.hexdigest()
 
 	# Check cache first
-	if cache_key in _evaluation_cache:
-		cached_result = _evaluation_cache[cache_key]
-		# Update session_id to match current request
-		cached_result.session_id = payload.session_id
-		
+	cached = _eval_cache_get(cache_key)
+	if cached is not None:
 		# Log cache hit
-		await auditor.log({
+		_audit_in_background({
 			"type": "evaluation",
 			"session_id": payload.session_id,
 			"problem": payload.problem,
 			"language": payload.language,
 			"cached": True,  # This is a cached result
 		})
-		
-		return cached_result
+		# Return the pre-serialized bytes directly; the key embeds the
+		# session id, so the body already belongs to this caller
+		return Response(content=cached[1], media_type="application/json")
 
-	# Run evaluation (static + LLM critique)
+	# Single-flight: identical requests already being evaluated share one
+	# LLM round-trip instead of each paying for their own
+	inflight = _inflight.get(cache_key)
+	if inflight is not None:
+		resp = await inflight
+		_audit_in_background({
+			"type": "evaluation",
+			"session_id": payload.session_id,
+			"problem": payload.problem,
+			"language": payload.language,
+			"cached": True,  # Coalesced onto an in-flight evaluation
+		})
+		return resp.model_copy(update={"session_id": payload.session_id})
+
+	fut: asyncio.Future = asyncio.get_running_loop().create_future()
+	_inflight[cache_key] = fut
 	try:
-		critique_text, static = await evaluate_code(payload.problem, payload.code, payload.language or "python", conversation_context)
+		resp, scores_dict = await _run_evaluation(payload, code_stripped, conversation_context)
+	except BaseException as e:
+		fut.set_exception(e)
+		fut.exception()  # mark retrieved in case no request is waiting
+		raise
+	finally:
+		_inflight.pop(cache_key, None)
+	fut.set_result(resp)
+
+	# Cache the result for future requests
+	_eval_cache_put(cache_key, resp)
+
+	# Ensure CORS header mirrors other endpoints for some hosts that require explicit setting
+	origin = request.headers.get("origin")
+	if origin:
+		response.headers["Access-Control-Allow-Origin"] = origin
+		response.headers["Vary"] = "Origin"
+
+	_audit_in_background({
+		"type": "evaluation",
+		"session_id": payload.session_id,
+		"problem": payload.problem,
+		"language": payload.language,
+		"scores": scores_dict,
+		"cached": False,  # This is a new evaluation
+	})
+
+	return resp
+
+
+async def _run_evaluation(payload: EvaluationIn, code_stripped: str, conversation_context: str) -> tuple[EvaluationOut, dict]:
+	"""Run the static + LLM evaluation and parse the critique into a response."""
+	try:
+		critique_text, static = await evaluate_code(payload.problem, code_stripped, payload.language or "python", conversation_context)
 	except Exception as e:
 		raise HTTPException(status_code=500, detail=f"LLM evaluation failed: {str(e)}")
 
-	# Extract scores JSON from critique text
-	# Look for 'Scores: {...}'
+	# Basic section parsing: one pass over the critique collects every section
+	sections = {m.group(1): m.group(2).strip() for m in _SECTION_RE.finditer(critique_text)}
+
+	# Extract the scores JSON from the Scores section
 	scores_dict = {
 		"correctness": 0.0,
 		"optimization": 0.0,
@@ -93,50 +220,26 @@ async def evaluate(payload: EvaluationIn, request: Request, response: Response):
 		"total": 0.0,
 	}
 	try:
-		marker = "Scores:"
-		if marker in critique_text:
-			json_part = critique_text.split(marker, 1)[1].strip()
-			# Grab first JSON object
-			start = json_part.find("{")
-			end = json_part.find("}")
-			if start != -1 and end != -1 and end > start:
-				blob = json_part[start:end+1]
-				scores_dict.update(json.loads(blob))
+		blob = _SCORES_BLOB_RE.search(sections.get("Scores", ""))
+		if blob:
+			scores_dict.update(orjson.loads(blob.group(0)))
 	except Exception:
 		pass
 
-	# Basic section parsing
-	def _section(title: str) -> str:
-		key = title + ":"
-		if key not in critique_text:
-			return ""
-		rem = critique_text.split(key, 1)[1]
-		# stop at next heading
-		for h in ["\n\nStrengths:", "\n\nWeaknesses:", "\n\nScores:", "\n\nRecommendations:"]:
-			if h in rem:
-				rem = rem.split(h, 1)[0]
-				break
-		return rem.strip()
-
 	# Prefer explicit Approach section if present; otherwise fallback to Summary; otherwise use full text
-	approach_text = _section("Approach")
-	summary = _section("Summary")
-	strengths_raw = _section("Strengths")
-	weaknesses_raw = _section("Weaknesses")
-	recs_raw = _section("Recommendations")
-
-	def _bullets(text: str) -> list[str]:
-		items = []
-		for line in text.splitlines():
-			l = line.strip()
-			if l.startswith("- "):
-				items.append(l[2:].strip())
-		return items
+	approach_text = sections.get("Approach", "")
+	summary = sections.get("Summary", "")
+	strengths_raw = sections.get("Strengths", "")
+	weaknesses_raw = sections.get("Weaknesses", "")
+	recs_raw = sections.get("Recommendations", "")
 
 	# Choose the best available approach content
 	_best_approach = (approach_text or summary or critique_text).strip()
 
-	resp = EvaluationOut(
+	# Scores come from LLM output, so keep full validation (range constraints)
+	# for them; everything else is our own trusted data and can skip pydantic
+	# re-validation via model_construct
+	resp = EvaluationOut.model_construct(
 		session_id=payload.session_id,
 		problem=payload.problem,
 		language=(payload.language or "python"),
@@ -145,7 +248,7 @@ async def evaluate(payload: EvaluationIn, request: Request, response: Response):
 		strengths=_bullets(strengths_raw),
 		weaknesses=_bullets(weaknesses_raw),
 		scores=EvaluationScores(**scores_dict),
-		static_signals=StaticSignals(**static),
+		static_signals=StaticSignals.model_construct(**static),
 		recommendations=_bullets(recs_raw),
 		created_at=datetime.utcnow(),
 		markdown=f"""
@@ -155,26 +258,8 @@ async def evaluate(payload: EvaluationIn, request: Request, response: Response):
 """,
 	)
 
-    # Diagrammatic evaluation disabled temporarily per user request.
+	# Diagrammatic evaluation disabled temporarily per user request.
 
-	# Cache the result for future requests
-	_evaluation_cache[cache_key] = resp
-
-	# Ensure CORS header mirrors other endpoints for some hosts that require explicit setting
-	origin = request.headers.get("origin")
-	if origin:
-		response.headers["Access-Control-Allow-Origin"] = origin
-		response.headers["Vary"] = "Origin"
-
-	await auditor.log({
-		"type": "evaluation",
-		"session_id": payload.session_id,
-		"problem": payload.problem,
-		"language": payload.language,
-		"scores": scores_dict,
-		"cached": False,  # This is a new evaluation
-	})
-
-	return resp
+	return resp, scores_dict
 
 
@@ -9,61 +9,80 @@ from app.services.code_evaluation_service import evaluate_code
 from app.utils.security import verify_api_key
 from app.utils.audit import auditor
 import asyncio
+import codecs
+import os
+import re
 
 
 router = APIRouter()
 
+# Fenced code blocks in answers; compiled once instead of per call
+_CODE_BLOCK_RE = re.compile(r"```(\w+)?\n(.*?)\n```", re.DOTALL)
 
-async def _auto_evaluate_if_code(session_id: str, question: str, answer: str) -> None:
-	"""Auto-evaluate if the answer contains code blocks."""
-	import re
-	
-	# Look for code blocks in the answer
-	code_pattern = r'```(\w+)?\n(.*?)\n```'
-	matches = re.findall(code_pattern, answer, re.DOTALL)
-	
-	if not matches:
+# At most this many auto-evaluations may hit the LLM concurrently; the rest
+# queue on the semaphore instead of fanning out unbounded under load
+_AUTO_EVAL_SEM = asyncio.Semaphore(8)
+
+# Strong references to scheduled auto-evaluations so the event loop cannot
+# drop them mid-run and shutdown can drain them
+_auto_eval_tasks: set[asyncio.Task] = set()
+
+
+def _schedule_auto_evaluate(state, question: str, answer: str) -> None:
+	# A fenced block needs two ``` markers; this C-level count skips task
+	# creation and the DOTALL regex for the common no-code answer
+	if answer.count("```") < 2:
 		return
-	
-	# Get the most substantial code block
+	task = asyncio.create_task(_auto_evaluate_if_code(state, question, answer))
+	_auto_eval_tasks.add(task)
+	task.add_done_callback(_auto_eval_tasks.discard)
+
+
+async def drain_auto_evaluations() -> None:
+	"""Wait for in-flight auto-evaluations (called on app shutdown)."""
+	if _auto_eval_tasks:
+		await asyncio.gather(*_auto_eval_tasks, return_exceptions=True)
+
+
+async def _auto_evaluate_if_code(session_state, question: str, answer: str) -> None:
+	"""Auto-evaluate if the answer contains code blocks."""
+	# Track the most substantial code block in a single scan rather than
+	# materializing every match first
 	best_code = ""
 	best_lang = "python"
-	for lang, code in matches:
-		if len(code.strip()) > len(best_code.strip()):
-			best_code = code.strip()
-			best_lang = lang or "python"
-	
+	for m in _CODE_BLOCK_RE.finditer(answer):
+		code = m.group(2).strip()
+		if len(code) > len(best_code):
+			best_code = code
+			best_lang = m.group(1) or "python"
+
 	if not best_code:
 		return
 	
-	# Auto-trigger evaluation in background
-	try:
-		# Get conversation context
-		session_state = await session_manager.get_required(session_id)
-		conversation_context = ""
-		if session_state.qna:
-			recent_qna = session_state.qna[-2:] if len(session_state.qna) >= 2 else session_state.qna
-			for item in recent_qna:
-				conversation_context += f"Q: {item.get('question', '')}\nA: {item.get('answer', '')}\n"
-		
-		# Run evaluation
-		await evaluate_code(question, best_code, best_lang, conversation_context)
+	# Auto-trigger evaluation in background, bounded by the semaphore
+	async with _AUTO_EVAL_SEM:
+		try:
+			# Caller already holds the session state; no second lookup needed
+			conversation_context = session_state.recent_context()
+
+			# Run evaluation
+			await evaluate_code(question, best_code, best_lang, conversation_context)
 		
-		# Log auto-evaluation
-		await auditor.log({
-			"type": "auto_evaluation",
-			"session_id": session_id,
-			"question": question,
-			"language": best_lang,
-			"auto_triggered": True,
-		})
-	except Exception as e:
-		# Don't fail the main request if evaluation fails
-		await auditor.log({
-			"type": "auto_evaluation_error",
-			"session_id": session_id,
-			"error": str(e),
-		})
+			# Log auto-evaluation
+			await auditor.log({
+				"type": "auto_evaluation",
+				"session_id": session_state.session_id,
+				"question": question,
+				"language": best_lang,
+				"auto_triggered": True,
+			})
+		except Exception as e:
+			# Don't fail the main request if evaluation fails
+			await auditor.log({
+				"type": "auto_evaluation_error",
+				"session_id": session_state.session_id,
+				"error": str(e),
+			})
 
 
 @router.post("/session", response_model=CreateSessionResponse)
@@ -114,7 +133,7 @@ async def submit_question(payload: QuestionIn):
 			})
 			
 			# Auto-evaluate if response contains code
-			asyncio.create_task(_auto_evaluate_if_code(state.session_id, payload.question, full_answer))
+			_schedule_auto_evaluate(state, payload.question, full_answer)
 			
 			yield "event: end\n\n"
 
@@ -142,7 +161,7 @@ async def submit_question(payload: QuestionIn):
 	})
 	
 	# Auto-evaluate if response contains code
-	asyncio.create_task(_auto_evaluate_if_code(state.session_id, payload.question, answer))
+	_schedule_auto_evaluate(state, payload.question, answer)
 	
 	return AnswerOut(answer=answer, created_at=datetime.utcnow())
 
@@ -162,27 +181,30 @@ async def upload_profile(
 	filename = (file.filename or "").lower()
 	content_type = (file.content_type or "").lower()
 
-	# Read bytes
-	data = await file.read()
-
 	text: str = ""
-	try:
-		if filename.endswith(".txt") or content_type.startswith("text/"):
-			text = data.decode("utf-8", errors="ignore")
-		elif filename.endswith(".md"):
-			text = data.decode("utf-8", errors="ignore")
-		elif filename.endswith(".pdf") or content_type == "application/pdf":
-			# Lazy import to avoid heavy dependency at startup
-			try:
-				from app.utils.text_extract import extract_text_from_pdf  # type: ignore
-			except Exception:
-				raise HTTPException(status_code=415, detail="PDF support not available. Please install pdfminer.six or upload a text/markdown file.")
-			text = extract_text_from_pdf(data)
-		else:
-			# Fallback: try utf-8
-			text = data.decode("utf-8", errors="ignore")
-	except UnicodeDecodeError:
-		raise HTTPException(status_code=415, detail="Unable to decode file. Please upload a UTF-8 text, markdown, or PDF file.")
+	total_bytes = 0
+	if filename.endswith(".pdf") or content_type == "application/pdf":
+		# Lazy import to avoid heavy dependency at startup
+		try:
+			from app.utils.text_extract import extract_text_from_pdf  # type: ignore
+		except Exception:
+			raise HTTPException(status_code=415, detail="PDF support not available. Please install pdfminer.six or upload a text/markdown file.")
+		# Starlette already spools the upload to a temp file; hand the file
+		# object over instead of copying the whole PDF into memory
+		file.file.seek(0, os.SEEK_END)
+		total_bytes = file.file.tell()
+		text = extract_text_from_pdf(file.file)
+	else:
+		# Text/markdown (and unknown types as a utf-8 fallback): stream-decode
+		# chunk by chunk instead of buffering the bytes and decoding a second
+		# full-size copy
+		decoder = codecs.getincrementaldecoder("utf-8")(errors="ignore")
+		parts: list[str] = []
+		while chunk := await file.read(65536):
+			total_bytes += len(chunk)
+			parts.append(decoder.decode(chunk))
+		parts.append(decoder.decode(b"", final=True))
+		text = "".join(parts)
 
 	if not text.strip():
 		raise HTTPException(status_code=400, detail="Uploaded file appears empty.")
@@ -192,7 +214,7 @@ async def upload_profile(
 		"type": "profile_upload",
 		"session_id": session_id,
 		"filename": file.filename,
-		"bytes": len(data),
+		"bytes": total_bytes,
 	})
 
 	return {"status": "ok", "characters": len(text)}
@@ -204,25 +226,27 @@ async def get_history(session_id: str):
 		state = await session_manager.get_required(session_id)
 	except KeyError:
 		raise HTTPException(status_code=404, detail="Session not found")
+	# Server-side data is already well-formed; model_construct skips
+	# per-item validation in this loop
 	items = [
-		QnA(question=i["question"], answer=i["answer"], created_at=datetime.fromisoformat(i["created_at"]))
+		QnA.model_construct(question=i["question"], answer=i["answer"], created_at=i["created_at"])
 		for i in state.qna
 	]
-	return SessionHistory(session_id=session_id, items=items)
+	return SessionHistory.model_construct(session_id=session_id, items=items)
 
 
 @router.get("/sessions", response_model=SessionList)
 async def list_sessions():
 	items_raw = await session_manager.list_sessions()
 	items = [
-		SessionSummary(
+		SessionSummary.model_construct(
 			session_id=i["session_id"],
-			last_update=datetime.fromisoformat(i["last_update"]),
+			last_update=i["last_update"],
 			qna_count=i["qna_count"],
 		)
 		for i in items_raw
 	]
-	return SessionList(items=items)
+	return SessionList.model_construct(items=items)
 
 
 @router.delete("/session/{session_id}")
@@ -12,10 +12,14 @@ router = APIRouter()
 
 
 async def _iter_audio(websocket: WebSocket) -> AsyncIterator[bytes]:
+	# Audio arrives at tens of frames per second; bind the receive coroutine
+	# once and fetch the payload with a single dict lookup per frame
+	receive = websocket.receive
 	while True:
-		msg = await websocket.receive()
-		if "bytes" in msg and msg["bytes"] is not None:
-			yield msg["bytes"]
+		msg = await receive()
+		data = msg.get("bytes")
+		if data is not None:
+			yield data
 		elif msg.get("text") == "__end__":
 			break
 
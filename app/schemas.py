@@ -1,9 +1,21 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field, field_validator
 from typing import List, Optional
 from datetime import datetime
 
 
+# Accepted values per style field; anything else collapses to None so the
+# style engine applies its default rule. Normalizing here means downstream
+# consumers never re-lowercase or re-map free-form input per request.
+_STYLE_FIELD_VALUES = {
+	"style_mode": frozenset({"auto", "varied", "concise", "deep-dive", "mentor", "executive", "faq", "qa", "checklist", "narrative"}),
+	"tone": frozenset({"neutral", "friendly", "mentor", "executive", "academic", "coaching"}),
+	"layout": frozenset({"bullets", "narrative", "qa", "faq", "checklist", "pros-cons", "steps"}),
+}
+
+
 class CreateSessionResponse(BaseModel):
+	model_config = ConfigDict(frozen=True)
+
 	session_id: str
 
 
@@ -19,30 +31,48 @@ class QuestionIn(BaseModel):
 	variability: Optional[float] = Field(default=0.5, ge=0.0, le=1.0, description="0–1; higher = more variety in tone/layout")
 	seed: Optional[int] = Field(default=None, description="Optional seed to make style variation deterministic")
 
+	@field_validator("style_mode", "tone", "layout")
+	@classmethod
+	def _normalize_style_field(cls, value: Optional[str], info) -> Optional[str]:
+		if value is None:
+			return None
+		value = value.strip().lower()
+		return value if value in _STYLE_FIELD_VALUES[info.field_name] else None
+
 
 class AnswerOut(BaseModel):
+	model_config = ConfigDict(frozen=True)
+
 	answer: str
 	created_at: datetime
 
 
 class QnA(BaseModel):
+	model_config = ConfigDict(frozen=True)
+
 	question: str
 	answer: str
 	created_at: datetime
 
 
 class SessionHistory(BaseModel):
+	model_config = ConfigDict(frozen=True)
+
 	session_id: str
 	items: List[QnA]
 
 
 class SessionSummary(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
     session_id: str
     last_update: datetime
     qna_count: int
 
 
 class SessionList(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
     items: List[SessionSummary]
 
 
@@ -1,90 +1,219 @@
 from __future__ import annotations
 
-from typing import Tuple, List
+from collections import OrderedDict
+from typing import Dict, Tuple, List
 import ast
+import asyncio
+import hashlib
 import json
+import re
+import time
 
 from app.services.llm_service import llm_service
 
 
+# Cache of full evaluate_code results, shared by the /evaluate endpoint and
+# the background auto-evaluation, so identical content never re-hits the LLM
+# no matter which path asks. Bounded LRU with a TTL, same shape as the
+# router-level response cache.
+_RESULT_CACHE_MAX_ENTRIES = 1024
+_RESULT_CACHE_TTL_SECONDS = 3600.0
+_result_cache: "OrderedDict[str, tuple[float, Tuple[str, dict]]]" = OrderedDict()
+
+# Single-flight futures for evaluations currently in progress
+_inflight: Dict[str, asyncio.Future] = {}
+
+# dont_inherit keeps compile() from consulting the caller's __future__ flags
+# on every parse; PyCF_OPTIMIZED_AST (3.13+) additionally skips building
+# docstring/debug nodes we never look at
+_AST_FLAGS = ast.PyCF_ONLY_AST | getattr(ast, "PyCF_OPTIMIZED_AST", 0)
+
+# Below this size analysis is cheaper than a thread handoff; above it the
+# parse and walk move off the event loop so concurrent requests keep flowing
+_ANALYSIS_OFFLOAD_BYTES = 8192
+
+# Callable/decorator names that signal memoization, matched whether they
+# appear bare (from functools import lru_cache) or as an attribute
+# (functools.lru_cache)
+_MEMO_NAMES = frozenset({"lru_cache", "cache", "memoize", "cached_property"})
+
+# Statement openers that mark a submission as Python, and syntax that marks
+# it as something else; both only ever scan the first 2 KB
+_PY_SNIFF_RE = re.compile(r"(?m)^\s*(?:def |import |from .+ import|class \w+\s*[:(])")
+_FOREIGN_SNIFF_RE = re.compile(r"function\s|=>|\)\s*\{")
+
+
+def _looks_like_python(code: str) -> bool:
+	"""Cheap sniff so code mislabeled as Python skips the guaranteed-to-fail
+	parse. Plain statement scripts carry neither marker and still get the
+	real analysis; only clearly foreign syntax is routed to the heuristics."""
+	head = code[:2048]
+	if _PY_SNIFF_RE.search(head):
+		return True
+	return _FOREIGN_SNIFF_RE.search(head) is None
+
+
+def _result_cache_key(problem: str | None, code: str, language: str, conversation_context: str) -> str:
+	h = hashlib.blake2b(digest_size=16)
+	for part in (problem or "", code, language, conversation_context):
+		h.update(part.encode())
+		h.update(b"|")
+	return h.hexdigest()
+
+
+# Static-analysis results keyed by a hash of the source, so re-evaluations of
+# the same code (new problem text, different conversation context, an expired
+# critique) skip the parse and walk entirely. The analysis is deterministic,
+# so entries never go stale and no TTL is needed.
+_SIGNALS_CACHE_MAX_ENTRIES = 512
+_signals_cache: "OrderedDict[str, dict]" = OrderedDict()
+
+
 def _analyze_python_ast(code: str) -> dict:
-	"""Lightweight static signals from Python source using AST."""
-	try:
-		tree = ast.parse(code)
-	except Exception:
-		return {
-			"uses_recursion": False,
-			"uses_memoization": False,
-			"uses_dynamic_programming": False,
-			"loop_nesting_depth": 0,
-			"uses_slicing_heavily": (code.count(":") > 10),
-			"uses_list_or_set_comprehension": ("[" in code and "] for" in code) or ("{" in code and " for" in code),
-			"function_count": code.count("def "),
-			"comment_density": _comment_density(code),
-			"estimated_time_complexity_hint": None,
-		}
+	"""Lightweight static signals from Python source using AST (cached)."""
+	key = hashlib.blake2b(code.encode(), digest_size=16).hexdigest()
+	cached = _signals_cache.get(key)
+	if cached is not None:
+		_signals_cache.move_to_end(key)
+		return dict(cached)
+	signals = _analyze_python_ast_uncached(code)
+	_signals_cache[key] = signals
+	while len(_signals_cache) > _SIGNALS_CACHE_MAX_ENTRIES:
+		_signals_cache.popitem(last=False)
+	# Copies keep callers from mutating the cached dict in place
+	return dict(signals)
 
+
+# Past these bounds a full parse+walk costs more latency than the signals are
+# worth (and ties up the process on adversarial payloads); fall back to the
+# same cheap heuristics used when the source fails to parse
+_MAX_AST_BYTES = 200_000
+_MAX_AST_LINES = 5_000
+
+
+def _python_heuristic_signals(code: str) -> dict:
+	"""Cheap signals for Python source that cannot or should not be parsed."""
+	return {
+		"uses_recursion": False,
+		"uses_memoization": False,
+		"uses_dynamic_programming": False,
+		"loop_nesting_depth": 0,
+		"uses_slicing_heavily": _uses_slicing_heavily(code),
+		"uses_list_or_set_comprehension": ("[" in code and "] for" in code) or ("{" in code and " for" in code),
+		"function_count": code.count("def "),
+		"comment_density": _comment_density(code),
+		"estimated_time_complexity_hint": None,
+	}
+
+
+# Per-function signal fragments keyed by a hash of the function's source, so
+# re-analyzing a file after a small edit only walks the functions that
+# actually changed. Fragments stay valid across inputs because cross-function
+# recursion is resolved at merge time, not inside the fragment.
+_FRAGMENT_CACHE_MAX_ENTRIES = 2048
+_fragment_cache: "OrderedDict[str, dict]" = OrderedDict()
+
+
+def _collect_fragment(nodes: List[ast.AST]) -> dict:
+	"""Signals for one or more subtrees via a single fused, iterative walk.
+
+	No NodeVisitor class built per call, no Python-level generic_visit
+	recursion, one type() dispatch per node. Stack frames carry the loop
+	depth so nesting tracking survives the flat traversal. Calls are
+	recorded by name rather than matched here; the caller intersects them
+	with the full set of defined functions.
+	"""
 	max_loop_depth = 0
-	current_depth = 0
-	uses_recursion = False
 	uses_memo = False
 	uses_dp = False
 	comp_used = False
-
 	func_defs: List[str] = []
+	called: set = set()
 
-	class Visitor(ast.NodeVisitor):
-		def visit_FunctionDef(self, node: ast.FunctionDef) -> None:
-			func_defs.append(node.name)
-			self.generic_visit(node)
-
-		def visit_For(self, node: ast.For) -> None:
-			nonlocal current_depth, max_loop_depth
-			current_depth += 1
-			max_loop_depth = max(max_loop_depth, current_depth)
-			self.generic_visit(node)
-			current_depth -= 1
-
-		def visit_While(self, node: ast.While) -> None:
-			nonlocal current_depth, max_loop_depth
-			current_depth += 1
-			max_loop_depth = max(max_loop_depth, current_depth)
-			self.generic_visit(node)
-			current_depth -= 1
-
-		def visit_Call(self, node: ast.Call) -> None:
-			nonlocal uses_recursion, uses_memo
-			try:
-				func_name = getattr(node.func, "id", None) or getattr(getattr(node.func, "attr", None), "id", None)
-			except Exception:
-				func_name = None
-			if func_name and func_name in func_defs:
-				uses_recursion = True
-			if isinstance(node.func, ast.Attribute) and node.func.attr == "lru_cache":
-				uses_memo = True
-			self.generic_visit(node)
-
-		def visit_ListComp(self, node: ast.ListComp) -> None:
-			nonlocal comp_used
-			comp_used = True
-			self.generic_visit(node)
+	# Pre-bound locals: LOAD_FAST beats a module-attribute lookup per node,
+	# and identity checks on type() skip isinstance's subclass machinery
+	# (AST node classes are never subclassed here)
+	_FDef, _For, _While, _Call = ast.FunctionDef, ast.For, ast.While, ast.Call
+	_LC, _SC, _Sub = ast.ListComp, ast.SetComp, ast.Subscript
+	_children = ast.iter_child_nodes
 
-		def visit_SetComp(self, node: ast.SetComp) -> None:
-			nonlocal comp_used
+	stack: list[tuple[ast.AST, int]] = [(node, 0) for node in reversed(nodes)]
+	while stack:
+		node, depth = stack.pop()
+		t = type(node)
+		if t is _FDef:
+			func_defs.append(node.name)
+		elif t is _For or t is _While:
+			depth += 1
+			if depth > max_loop_depth:
+				max_loop_depth = depth
+		elif t is _Call:
+			func_name = getattr(node.func, "id", None) or getattr(node.func, "attr", None)
+			if func_name:
+				called.add(func_name)
+				if func_name in _MEMO_NAMES:
+					uses_memo = True
+		elif t is _LC or t is _SC:
 			comp_used = True
-			self.generic_visit(node)
-
-		def visit_Subscript(self, node: ast.Subscript) -> None:
-			nonlocal uses_dp
+		elif t is _Sub:
 			# Heuristic: nested subscripts often indicate DP tables/matrices
-			if isinstance(node.value, ast.Subscript):
+			if type(node.value) is _Sub:
 				uses_dp = True
-			self.generic_visit(node)
+		children = [(child, depth) for child in _children(node)]
+		children.reverse()
+		stack.extend(children)
+
+	return {
+		"names": tuple(func_defs),
+		"called": frozenset(called),
+		"depth": max_loop_depth,
+		"memo": uses_memo,
+		"dp": uses_dp,
+		"comp": comp_used,
+	}
+
+
+def _analyze_python_ast_uncached(code: str) -> dict:
+	if len(code) > _MAX_AST_BYTES or code.count("\n") > _MAX_AST_LINES:
+		return _python_heuristic_signals(code)
+	try:
+		tree = compile(code, "<eval>", "exec", flags=_AST_FLAGS, dont_inherit=True)
+	except Exception:
+		return _python_heuristic_signals(code)
 
-	Visitor().visit(tree)
+	# Route each top-level function through the fragment cache; after a small
+	# edit only the changed function is re-walked. Everything else (module
+	# statements, classes, async defs) is analyzed together as one fragment.
+	fragments: List[dict] = []
+	rest: List[ast.AST] = []
+	for node in tree.body:
+		if type(node) is ast.FunctionDef:
+			segment = ast.get_source_segment(code, node)
+			if segment is not None:
+				fkey = hashlib.blake2b(segment.encode(), digest_size=16).hexdigest()
+				fragment = _fragment_cache.get(fkey)
+				if fragment is None:
+					fragment = _collect_fragment([node])
+					_fragment_cache[fkey] = fragment
+					while len(_fragment_cache) > _FRAGMENT_CACHE_MAX_ENTRIES:
+						_fragment_cache.popitem(last=False)
+				else:
+					_fragment_cache.move_to_end(fkey)
+				fragments.append(fragment)
+				continue
+		rest.append(node)
+	if rest:
+		fragments.append(_collect_fragment(rest))
 
-	# Very rough slicing heuristic
-	uses_slicing = code.count(":") > 10
+	func_defs = [name for fragment in fragments for name in fragment["names"]]
+	defined = set(func_defs)
+	uses_recursion = any(not fragment["called"].isdisjoint(defined) for fragment in fragments)
+	uses_memo = any(fragment["memo"] for fragment in fragments)
+	uses_dp = any(fragment["dp"] for fragment in fragments)
+	comp_used = any(fragment["comp"] for fragment in fragments)
+	max_loop_depth = max((fragment["depth"] for fragment in fragments), default=0)
+
+	uses_slicing = _uses_slicing_heavily(code)
 
 	# Simple time complexity hint
 	hint = None
@@ -108,35 +237,97 @@ def _analyze_python_ast(code: str) -> dict:
 	}
 
 
+# Comment and non-blank lines; matched in C instead of a Python loop over
+# splitlines with a strip per line
+_COMMENT_LINE_RE = re.compile(r"(?m)^[ \t]*#")
+_NONBLANK_LINE_RE = re.compile(r"(?m)^[ \t]*\S")
+
+# Bracketed slice syntax like a[1:n] or m[i:j]; a bare ':' count also picks
+# up annotations, dict literals and signatures, so match actual slices
+_SLICE_RE = re.compile(r"\[[^\]\n]*:[^\]\n]*\]")
+
+
+def _uses_slicing_heavily(code: str) -> bool:
+	return len(_SLICE_RE.findall(code)) > 3
+
+
 def _comment_density(code: str) -> float:
-	lines = [l for l in code.splitlines()]
-	if not lines:
-		return 0.0
-	comment_lines = sum(1 for l in lines if l.strip().startswith("#"))
-	code_lines = sum(1 for l in lines if l.strip() and not l.strip().startswith("#"))
-	if code_lines == 0:
+	comment_lines = len(_COMMENT_LINE_RE.findall(code))
+	code_lines = len(_NONBLANK_LINE_RE.findall(code)) - comment_lines
+	if code_lines <= 0:
 		return 0.0
-	return round(min(1.0, comment_lines / max(1, code_lines)), 3)
+	return round(min(1.0, comment_lines / code_lines), 3)
+
+
+def _fallback_signals(code: str) -> dict:
+	"""Lightweight heuristics for non-Python sources.
+
+	Lowercases the code once up front; the old inline dict rebuilt the
+	lowered copy for five separate substring checks. All scans below are
+	single C-level passes, so checks are now uniformly case-insensitive.
+	"""
+	lower = code.lower()
+	return {
+		"uses_recursion": ("def " in lower and "(" in lower and ")" in lower and "return" in lower and ("recurs" in lower or "self(" in lower or "function" in lower)),
+		"uses_memoization": ("memo" in lower or "cache" in lower),
+		"uses_dynamic_programming": ("dp" in lower or "table" in lower),
+		"loop_nesting_depth": lower.count("for ") + lower.count("while "),
+		"uses_slicing_heavily": lower.count(":") > 10,
+		"uses_list_or_set_comprehension": ("for (" in lower and ") {" in lower) or ("=>" in lower and "map" in lower),
+		"function_count": lower.count("function") + lower.count("def "),
+		"comment_density": _comment_density(code),
+		"estimated_time_complexity_hint": None,
+	}
 
 
 async def evaluate_code(problem: str | None, code: str, language: str, conversation_context: str = "") -> Tuple[str, dict]:
-	"""Returns (llm_text, static_signals)."""
+	"""Returns (llm_text, static_signals).
+
+	Results are cached and deduplicated here so every caller (the /evaluate
+	endpoint and the auto-evaluation task) shares one LLM round-trip for
+	identical (problem, code, language, context) inputs.
+	"""
 	lang = (language or "").lower().strip() or "python"
-	if lang == "py" or lang == "python":
-		static = _analyze_python_ast(code)
+
+	key = _result_cache_key(problem, code, lang, conversation_context)
+	entry = _result_cache.get(key)
+	if entry is not None:
+		expires_at, result = entry
+		if time.monotonic() <= expires_at:
+			_result_cache.move_to_end(key)
+			return result
+		del _result_cache[key]
+
+	inflight = _inflight.get(key)
+	if inflight is not None:
+		return await inflight
+
+	fut: asyncio.Future = asyncio.get_running_loop().create_future()
+	_inflight[key] = fut
+	try:
+		result = await _evaluate_code_uncached(problem, code, lang, conversation_context)
+	except BaseException as e:
+		fut.set_exception(e)
+		fut.exception()  # mark retrieved in case no caller is waiting
+		raise
+	finally:
+		_inflight.pop(key, None)
+	fut.set_result(result)
+
+	_result_cache[key] = (time.monotonic() + _RESULT_CACHE_TTL_SECONDS, result)
+	while len(_result_cache) > _RESULT_CACHE_MAX_ENTRIES:
+		_result_cache.popitem(last=False)
+	return result
+
+
+async def _evaluate_code_uncached(problem: str | None, code: str, lang: str, conversation_context: str) -> Tuple[str, dict]:
+	analyze = _analyze_python_ast if (lang == "py" or lang == "python") and _looks_like_python(code) else _fallback_signals
+	if len(code) > _ANALYSIS_OFFLOAD_BYTES:
+		# Parsing large submissions is CPU work that would otherwise stall
+		# every concurrent request (streamed answers included) on the loop
+		static = await asyncio.to_thread(analyze, code)
 	else:
-		# Fallback lightweight heuristics for non-Python
-		static = {
-			"uses_recursion": ("def " in code and "(" in code and ")" in code and "return" in code and ("recurs" in code.lower() or "self(" in code or "function" in code)),
-			"uses_memoization": ("memo" in code.lower() or "cache" in code.lower()),
-			"uses_dynamic_programming": ("dp" in code.lower() or "table" in code.lower()),
-			"loop_nesting_depth": code.count("for ") + code.count("while "),
-			"uses_slicing_heavily": code.count(":") > 10,
-			"uses_list_or_set_comprehension": ("for (" in code and ") {" in code) or ("=>" in code and "map" in code),
-			"function_count": code.lower().count("function") + code.count("def "),
-			"comment_density": _comment_density(code),
-			"estimated_time_complexity_hint": None,
-		}
+		static = analyze(code)
 
 	critique = await llm_service.evaluate_code_with_critique(problem or "", code, lang, conversation_context)
 	return critique, static
@@ -17,6 +17,22 @@ class SessionState:
 	last_update: datetime = field(default_factory=datetime.utcnow)
 	profile_text: str = ""
 
+	def recent_context(self) -> str:
+		"""Last two QnA pairs formatted for prompts.
+
+		Cached on the instance (as a plain attribute so asdict() never
+		serializes it) and rebuilt only when the history changes.
+		"""
+		cached = getattr(self, "_ctx_cache", None)
+		if cached is not None and cached[0] == len(self.qna):
+			return cached[1]
+		ctx = "".join(
+			f"Q: {item.get('question', '')}\nA: {item.get('answer', '')}\n"
+			for item in self.qna[-2:]
+		)
+		self._ctx_cache = (len(self.qna), ctx)
+		return ctx
+
 
 class SessionManager:
 	def __init__(self) -> None:
@@ -32,9 +48,15 @@ class SessionManager:
 
 	def _serialize(self, state: SessionState) -> dict:
 		data = asdict(state)
-		# Convert datetime to isoformat
+		# Datetimes stay as objects in memory and become isoformat strings
+		# only here, at the disk-flush boundary
 		if isinstance(state.last_update, datetime):
 			data["last_update"] = state.last_update.isoformat()
+		data["qna"] = [
+			{**item, "created_at": item["created_at"].isoformat()}
+			if isinstance(item.get("created_at"), datetime) else item
+			for item in state.qna
+		]
 		return data
 
 	def _deserialize(self, data: dict) -> SessionState:
@@ -46,9 +68,19 @@ class SessionManager:
 				last_dt = datetime.utcnow()
 		else:
 			last_dt = datetime.utcnow()
+		# Parse QnA timestamps once at load instead of on every history read
+		qna: List[dict] = []
+		for item in data.get("qna", []):
+			created = item.get("created_at")
+			if isinstance(created, str):
+				try:
+					item = {**item, "created_at": datetime.fromisoformat(created)}
+				except Exception:
+					pass
+			qna.append(item)
 		return SessionState(
 			session_id=data["session_id"],
-			qna=list(data.get("qna", [])),
+			qna=qna,
 			partial_transcript=data.get("partial_transcript", ""),
 			last_update=last_dt,
 			profile_text=data.get("profile_text", ""),
@@ -90,8 +122,9 @@ class SessionManager:
 		state.qna.append({
 			"question": question,
 			"answer": answer,
-			"created_at": datetime.utcnow().isoformat(),
+			"created_at": datetime.utcnow(),
 		})
+		state._ctx_cache = None
 		state.last_update = datetime.utcnow()
 		self._save(state)
 
@@ -131,7 +164,7 @@ class SessionManager:
 		for s in self._sessions.values():
 			items.append({
 				"session_id": s.session_id,
-				"last_update": s.last_update.isoformat(),
+				"last_update": s.last_update,
 				"qna_count": len(s.qna),
 			})
 		# Newest first
@@ -156,6 +189,7 @@ class SessionManager:
 		"""Clear QnA history for a session but keep the session and profile."""
 		state = await self.get_required(session_id)
 		state.qna.clear()
+		state._ctx_cache = None
 		state.last_update = datetime.utcnow()
 		self._save(state)
 
@@ -165,6 +199,7 @@ class SessionManager:
 		if index < 0 or index >= len(state.qna):
 			raise IndexError("qna index out of range")
 		state.qna.pop(index)
+		state._ctx_cache = None
 		state.last_update = datetime.utcnow()
 		self._save(state)
 
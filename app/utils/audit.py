@@ -1,28 +1,97 @@
-from __future__ import annotations
-
-import json
-from pathlib import Path
-from datetime import datetime
-from typing import Optional, Dict, Any
-import asyncio
-
-
-class JsonlAuditor:
-	def __init__(self, path: Optional[str] = None) -> None:
-		self._path = Path(path) if path else None
-		self._lock = asyncio.Lock()
-
-	def configure(self, path: Optional[str]) -> None:
-		self._path = Path(path) if path else None
-
-	async def log(self, record: Dict[str, Any]) -> None:
-		if not self._path:
-			return
-		line = json.dumps({"ts": datetime.utcnow().isoformat(), **record}, ensure_ascii=False)
-		async with self._lock:
-			self._path.parent.mkdir(parents=True, exist_ok=True)
-			with self._path.open("a", encoding="utf-8") as f:
-				f.write(line + "\n")
-
-
-auditor = JsonlAuditor()
+from __future__ import annotations
+
+import json
+from pathlib import Path
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+import asyncio
+
+
+class JsonlAuditor:
+	"""Append-only JSONL audit log.
+
+	When started, records are queued and flushed in batches by a single
+	consumer task so request handlers never wait on file I/O; without a
+	running consumer (scripts, tests) log() falls back to a direct write.
+	"""
+
+	_QUEUE_MAX = 10000
+	_BATCH_MAX = 256
+	_FLUSH_WINDOW_SECONDS = 0.1
+
+	def __init__(self, path: Optional[str] = None) -> None:
+		self._path = Path(path) if path else None
+		self._lock = asyncio.Lock()
+		self._queue: Optional[asyncio.Queue] = None
+		self._consumer: Optional[asyncio.Task] = None
+		self._dropped = 0
+
+	def configure(self, path: Optional[str]) -> None:
+		self._path = Path(path) if path else None
+
+	async def start(self) -> None:
+		"""Start the batching consumer (called on app startup)."""
+		if self._consumer is None:
+			self._queue = asyncio.Queue(maxsize=self._QUEUE_MAX)
+			self._consumer = asyncio.create_task(self._consume())
+
+	async def stop(self) -> None:
+		"""Flush queued records and stop the consumer (called on shutdown)."""
+		task, self._consumer = self._consumer, None
+		if task is not None:
+			task.cancel()
+			try:
+				await task
+			except asyncio.CancelledError:
+				pass
+		queue, self._queue = self._queue, None
+		if queue is not None and self._path:
+			lines: List[str] = []
+			while not queue.empty():
+				lines.append(queue.get_nowait())
+			if lines:
+				await self._write_lines(lines)
+
+	async def log(self, record: Dict[str, Any]) -> None:
+		if not self._path:
+			return
+		line = json.dumps({"ts": datetime.utcnow().isoformat(), **record}, ensure_ascii=False)
+		queue = self._queue
+		if queue is None:
+			await self._write_lines([line])
+			return
+		try:
+			queue.put_nowait(line)
+		except asyncio.QueueFull:
+			# Shedding audit records beats blocking request handlers
+			self._dropped += 1
+
+	async def _write_lines(self, lines: List[str]) -> None:
+		async with self._lock:
+			self._path.parent.mkdir(parents=True, exist_ok=True)
+			with self._path.open("a", encoding="utf-8") as f:
+				f.write("\n".join(lines) + "\n")
+
+	async def _consume(self) -> None:
+		queue = self._queue
+		loop = asyncio.get_running_loop()
+		while True:
+			lines = [await queue.get()]
+			try:
+				# Collect whatever else arrives within the flush window so
+				# bursts cost one file append instead of one per record
+				deadline = loop.time() + self._FLUSH_WINDOW_SECONDS
+				while len(lines) < self._BATCH_MAX:
+					remaining = deadline - loop.time()
+					if remaining <= 0:
+						break
+					lines.append(await asyncio.wait_for(queue.get(), remaining))
+			except asyncio.TimeoutError:
+				pass
+			except asyncio.CancelledError:
+				await self._write_lines(lines)
+				raise
+			await self._write_lines(lines)
+
+
+auditor = JsonlAuditor()
@@ -1,26 +1,35 @@
 from __future__ import annotations
 
+import secrets
+
 from fastapi import Header, HTTPException, status
 from typing import Optional
 
 from app.config import settings
 
 
+# Decided once at import: when no api_key is configured the dependencies
+# become immediate no-ops instead of re-checking settings per request
+_AUTH_ENABLED = bool(settings.api_key)
+
+
 async def verify_api_key(authorization: Optional[str] = Header(default=None)) -> None:
-	if not settings.api_key:
+	if not _AUTH_ENABLED:
 		return
 	if not authorization or not authorization.startswith("Bearer "):
 		raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Missing API key")
 	key = authorization.removeprefix("Bearer ")
-	if key != settings.api_key:
+	# Compare bytes: compare_digest raises TypeError on non-ASCII str input,
+	# and header values arrive latin-1-decoded, so a stray byte would 500
+	if not secrets.compare_digest(key.encode(), settings.api_key.encode()):
 		raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid API key")
 
 
 async def websocket_verify_api_key(sec_websocket_protocol: Optional[str] = Header(default=None)) -> None:
 	# Expect API key via Sec-WebSocket-Protocol when provided
-	if not settings.api_key:
+	if not _AUTH_ENABLED:
 		return
 	if not sec_websocket_protocol:
 		raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Missing API key")
-	if sec_websocket_protocol != settings.api_key:
+	if not secrets.compare_digest(sec_websocket_protocol.encode(), settings.api_key.encode()):
 		raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid API key")
@@ -1,19 +1,22 @@
 from __future__ import annotations
 
 from io import BytesIO
+from typing import BinaryIO, Union
 
 
-def extract_text_from_pdf(data: bytes) -> str:
-	"""Extract text from PDF bytes.
+def extract_text_from_pdf(data: Union[bytes, BinaryIO]) -> str:
+	"""Extract text from PDF bytes or a seekable binary file object.
 
 	Strategy:
 	1) Try PyPDF2 (fast, works on many text PDFs)
 	2) Fallback to pdfminer.six (more robust)
 	Returns empty string on failure.
 	"""
+	stream = BytesIO(data) if isinstance(data, (bytes, bytearray)) else data
 	try:
 		from PyPDF2 import PdfReader  # type: ignore
-		reader = PdfReader(BytesIO(data))
+		stream.seek(0)
+		reader = PdfReader(stream)
 		parts: list[str] = []
 		for page in reader.pages:
 			try:
@@ -30,7 +33,8 @@ def extract_text_from_pdf(data: bytes) -> str:
 	# Fallback to pdfminer
 	try:
 		from pdfminer.high_level import extract_text  # type: ignore
-		return extract_text(BytesIO(data)) or ""
+		stream.seek(0)
+		return extract_text(stream) or ""
 	except Exception:
 		return ""
 